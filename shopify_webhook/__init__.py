@@ -0,0 +1,3 @@
+from shopify_webhook.app import create_app
+
+__all__ = ['create_app']
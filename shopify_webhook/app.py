@@ -0,0 +1,403 @@
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache
+from dotenv import load_dotenv
+import os
+import hmac
+import hashlib
+import base64
+import binascii
+import logging
+import threading
+import time
+from pathlib import Path
+
+# Explicitly load environment variables (useful for local development)
+env_path = Path('.') / '.env'
+load_dotenv(dotenv_path=env_path)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson's C encoder/decoder, which is several
+    times faster than the stdlib on the nested dicts Shopify payloads carry.
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Cap request bodies well above any real product payload so oversized or
+# malicious POSTs are rejected before the body is buffered in memory.
+_MAX_BODY_BYTES = 2 * 1024 * 1024
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+# Fetch environment variables
+SHOPIFY_ACCESS_TOKEN = os.getenv('SHOPIFY_ACCESS_TOKEN')
+STORE_URL = os.getenv('STORE_URL')
+SHOPIFY_WEBHOOK_SECRET = os.getenv('SHOPIFY_WEBHOOK_SECRET')
+
+# Ensure required environment variables are loaded
+if not SHOPIFY_ACCESS_TOKEN or not STORE_URL or not SHOPIFY_WEBHOOK_SECRET:
+    raise ValueError("Missing SHOPIFY_ACCESS_TOKEN, STORE_URL, or SHOPIFY_WEBHOOK_SECRET in environment variables.")
+
+# Encode the webhook secret and run the HMAC key schedule once; each request
+# clones the prepared state instead of redoing the key setup per call.
+_SECRET_BYTES = SHOPIFY_WEBHOOK_SECRET.encode('utf-8')
+_HMAC_TEMPLATE = hmac.new(_SECRET_BYTES, digestmod=hashlib.sha256)
+
+# Debug-level so startup stays silent (and secret-free) in production logs.
+logging.debug("Shopify client configured for store=%s", STORE_URL)
+
+# Prebuilt responses for the fixed-payload branches; reusing them skips JSON
+# serialization and header assembly per request. Werkzeug sends the same
+# object every time, so these must never be mutated per request: reuse is
+# only safe while nothing touches the response after the view returns. If
+# after_request hooks, sessions, or per-response headers are ever added,
+# these have to become freshly built Responses or state will bleed across
+# requests.
+_OK = Response(b'{"status":"success"}', status=200, mimetype='application/json')
+_QUEUED = Response(b'{"status":"queued"}', status=202, mimetype='application/json')
+_DUPLICATE = Response(b'{"status":"duplicate"}', status=200, mimetype='application/json')
+_MISSING_HMAC = Response(b'{"status":"failure","message":"Missing HMAC header"}',
+                         status=400, mimetype='application/json')
+_BAD_HMAC = Response(b'{"status":"failure","message":"Webhook verification failed"}',
+                     status=401, mimetype='application/json')
+_BAD_PAYLOAD = Response(b'{"status":"failure","message":"Invalid product data"}',
+                        status=400, mimetype='application/json')
+_TOO_BIG = Response(b'{"status":"failure","message":"Payload too large"}',
+                    status=413, mimetype='application/json')
+
+# Optional background queue. When a Redis broker is configured, product
+# processing is pushed to Celery workers and the webhook returns immediately,
+# keeping well inside Shopify's 5 s delivery timeout. Without REDIS_URL
+# (e.g. on Vercel, where no long-lived worker exists) processing stays inline.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    from celery import Celery
+
+    celery = Celery('webhook', broker=REDIS_URL)
+
+    @celery.task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+    def process_product_task(product):
+        create_or_update_product(product)
+else:
+    celery = None
+
+# Optional request coalescing. Bulk edits can deliver hundreds of product
+# webhooks within seconds, many for the same SKU. With BATCH_WINDOW set to a
+# small value (e.g. 0.1 seconds), deliveries are buffered for that window and
+# redundant updates to the same SKU collapse into one write; the batch is then
+# flushed over the keep-alive session. Opt-in because the buffer only drains
+# while the process stays alive (gunicorn/gevent, not Vercel).
+BATCH_WINDOW = float(os.getenv('BATCH_WINDOW', '0'))
+_batch = {}
+_batch_lock = threading.Lock()
+_batch_pending = threading.Event()
+_batcher_thread = None
+
+def _enqueue_product(product):
+    """
+    Buffer a product for the batcher; the latest delivery per SKU wins.
+    """
+    global _batcher_thread
+    key = get_sku_from_product(product) or product.get('id')
+    with _batch_lock:
+        _batch[key] = product
+        if _batcher_thread is None:
+            _batcher_thread = threading.Thread(target=_run_batcher, daemon=True)
+            _batcher_thread.start()
+    _batch_pending.set()
+
+def _run_batcher():
+    while True:
+        _batch_pending.wait()
+        time.sleep(BATCH_WINDOW)  # let the rest of the burst arrive
+        with _batch_lock:
+            batch = list(_batch.values())
+            _batch.clear()
+            _batch_pending.clear()
+        for product in batch:
+            try:
+                create_or_update_product(product)
+            except Exception:
+                logging.exception("Failed to process batched product:")
+
+# Single session for all outbound Shopify calls: keep-alive avoids a fresh
+# TLS handshake per call, and the adapter retries transient failures.
+SESSION = requests.Session()
+SESSION.headers.update({
+    'Content-Type': 'application/json',
+    'X-Shopify-Access-Token': SHOPIFY_ACCESS_TOKEN
+})
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.2,
+                      status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# Process-local cache of SKU -> product id lookups, so repeated webhooks for
+# the same SKU (common during bulk edits) skip the Admin API round trip.
+# TTLCache is not thread-safe, and the cache is shared between request
+# handlers and the batcher thread, so access goes through _sku_lock.
+SKU_CACHE = TTLCache(maxsize=4096, ttl=300)
+_sku_lock = threading.Lock()
+
+# Shopify retries deliveries on any non-2xx response, so the same webhook can
+# arrive more than once. Remember recently seen delivery ids and acknowledge
+# repeats without redoing the lookup and write.
+_SEEN_WEBHOOKS = TTLCache(maxsize=10000, ttl=3600)
+_seen_lock = threading.Lock()
+
+def create_app():
+    """
+    Application factory: build the Flask app and wire up the webhook routes.
+    The Shopify session, caches, and HMAC state stay module-level so every
+    app instance in a process shares them.
+    """
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    app.config['MAX_CONTENT_LENGTH'] = _MAX_BODY_BYTES
+    app.add_url_rule('/', view_func=handle_webhook, methods=['POST'])
+    app.add_url_rule('/webhook', view_func=handle_webhook, methods=['POST'])
+    return app
+
+def verify_webhook(computed_digest, hmac_header):
+    """
+    Compare a computed HMAC digest against the base64-encoded header value.
+    The header's base64 is decoded once and compared against the raw digest,
+    keeping the comparison constant-time without an encode round trip.
+    """
+    try:
+        provided = base64.b64decode(hmac_header, validate=True)
+    except binascii.Error:
+        return False
+    return hmac.compare_digest(computed_digest, provided)
+
+def handle_webhook():
+    """
+    Handle incoming webhook from Shopify when a product is created or updated.
+    Verifies the webhook, validates the payload, and processes the product.
+    """
+    if request.content_length and request.content_length > _MAX_BODY_BYTES:
+        logging.error("Request body of %s bytes exceeds the limit.", request.content_length)
+        return _TOO_BIG
+
+    hmac_header = request.headers.get('X-Shopify-Hmac-Sha256')
+    if not hmac_header:
+        logging.error("Missing HMAC header in the request.")
+        return _MISSING_HMAC
+
+    # Read the body in chunks, feeding the HMAC as bytes come off the socket
+    # so digest work overlaps the network receive; one buffer is kept for the
+    # JSON parse below.
+    digest = _HMAC_TEMPLATE.copy()
+    body = bytearray()
+    while chunk := request.stream.read(8192):
+        digest.update(chunk)
+        body.extend(chunk)
+
+    if not verify_webhook(digest.digest(), hmac_header):
+        logging.error("Webhook verification failed.")
+        return _BAD_HMAC
+
+    webhook_id = request.headers.get('X-Shopify-Webhook-Id')
+    if webhook_id:
+        with _seen_lock:
+            if webhook_id in _SEEN_WEBHOOKS:
+                logging.info("Duplicate delivery of webhook %s; skipping.", webhook_id)
+                return _DUPLICATE
+            _SEEN_WEBHOOKS[webhook_id] = True
+
+    # Decode from the bytes already read for HMAC verification rather than
+    # letting request.get_json() parse the body a second time.
+    try:
+        json_data = orjson.loads(bytes(body))
+    except ValueError:
+        logging.error("Request body is not valid JSON.")
+        return _BAD_PAYLOAD
+
+    if not isinstance(json_data, dict) or 'id' not in json_data:
+        logging.error("Invalid product data received.")
+        return _BAD_PAYLOAD
+
+    if celery is not None:
+        # Workers pick the product up; run them with
+        #   celery -A shopify_webhook.app worker --concurrency=8
+        process_product_task.delay(json_data)
+        return _QUEUED
+
+    if BATCH_WINDOW > 0:
+        _enqueue_product(json_data)
+        return _QUEUED
+
+    try:
+        create_or_update_product(json_data)
+    except Exception as e:
+        logging.exception("Error processing the product:")
+        # The delivery id was recorded before processing; forget it so
+        # Shopify's retry of this failed delivery is not dismissed as a
+        # duplicate of a write that never happened.
+        if webhook_id:
+            with _seen_lock:
+                _SEEN_WEBHOOKS.pop(webhook_id, None)
+        return jsonify({'status': 'failure', 'message': str(e)}), 500
+
+    return _OK
+
+def create_or_update_product(product):
+    """
+    Create or update a product in the target store based on its SKU.
+    """
+    sku = get_sku_from_product(product)
+    if not sku:
+        logging.info("Product does not have a SKU; skipping processing.")
+        return
+
+    logging.info(f"Processing product with SKU: {sku}")
+
+    existing_product_id = get_existing_product_id_by_sku(sku)
+
+    try:
+        if existing_product_id:
+            # Optimistic update: in steady state the id comes from the cache,
+            # making this the only Shopify call for the webhook.
+            url = f"{STORE_URL}/products/{existing_product_id}.json"
+            logging.info(f"Updating product with ID {existing_product_id}")
+            response = SESSION.put(url, json={"product": product})
+            if response.status_code == 404:
+                # Stale id (product deleted since it was cached): evict and
+                # fall back to creating the product fresh.
+                with _sku_lock:
+                    SKU_CACHE.pop(sku, None)
+                logging.info(f"Product {existing_product_id} is gone; creating SKU {sku} anew")
+                response = SESSION.post(f"{STORE_URL}/products.json", json={"product": product})
+        else:
+            # Create a new product
+            url = f"{STORE_URL}/products.json"
+            logging.info(f"Creating new product with SKU {sku}")
+            response = SESSION.post(url, json={"product": product})
+    except requests.exceptions.RequestException as e:
+        logging.exception("HTTP request to the target store failed.")
+        raise Exception("HTTP request failed") from e
+
+    if response.status_code in (200, 201):
+        logging.info("Product created/updated successfully: %s", response.json())
+    else:
+        # The cached id may be stale (e.g. the product was deleted); drop it
+        # so the next delivery does a fresh lookup.
+        with _sku_lock:
+            SKU_CACHE.pop(sku, None)
+        logging.error("Error from target store: %s %s", response.status_code, response.text)
+        raise Exception(f"Error from target store: {response.status_code} {response.text}")
+
+def get_sku_from_product(product):
+    """
+    Extract SKU from the product's variants.
+    """
+    variants = product.get("variants")
+    if variants:
+        return variants[0].get("sku")  # Assuming the first variant's SKU is used
+    return None
+
+def get_existing_product_id_by_sku(sku):
+    """
+    Check if a product with the given SKU exists in the target store.
+    Uses the GraphQL Admin API variant search, which is indexed server-side,
+    instead of scanning the full product list.
+    Returns the product ID if found, otherwise None.
+    """
+    with _sku_lock:
+        cached_id = SKU_CACHE.get(sku)
+    if cached_id is not None:
+        return cached_id
+
+    # Quote the search term (escaping backslashes and quotes in the SKU) so
+    # the match is exact; unquoted terms are prefix-matched by Shopify's
+    # search syntax, and sku:SKU1 could return the product for SKU10.
+    escaped_sku = sku.replace('\\', '\\\\').replace('"', '\\"')
+    query = (
+        "query($query: String!) {"
+        " productVariants(first: 1, query: $query) {"
+        " edges { node { sku product { id } } } } }"
+    )
+    try:
+        response = SESSION.post(
+            f"{STORE_URL}/graphql.json",
+            json={"query": query, "variables": {"query": f'sku:"{escaped_sku}"'}}
+        )
+    except requests.exceptions.RequestException as e:
+        logging.exception("Failed to look up SKU in the target store.")
+        raise Exception("Failed to look up SKU") from e
+
+    if response.status_code == 200:
+        payload = response.json()
+        # Shopify's GraphQL API reports throttling and missing-scope errors
+        # with HTTP 200 and an in-band errors payload; treat those like a
+        # failed request, not like "SKU not found".
+        if not payload.get("errors") and payload.get("data") is not None:
+            edges = payload["data"].get("productVariants", {}).get("edges", [])
+            if edges:
+                node = edges[0]["node"]
+                # Double-check the returned variant before caching: a partial
+                # match must never become the target of a product overwrite.
+                if node.get("sku") != sku:
+                    logging.error("SKU search for %r returned variant with SKU %r; ignoring.",
+                                  sku, node.get("sku"))
+                    return None
+                # GraphQL returns a gid like gid://shopify/Product/123456789
+                gid = node["product"]["id"]
+                product_id = gid.rsplit('/', 1)[-1]
+                with _sku_lock:
+                    SKU_CACHE[sku] = product_id
+                return product_id
+            return None
+        logging.error("GraphQL SKU lookup returned errors: %s; falling back to the REST scan.",
+                      payload.get("errors"))
+    else:
+        logging.error("GraphQL SKU lookup failed (%s); falling back to the REST scan.",
+                      response.status_code)
+
+    product_id = _lookup_sku_rest(sku)
+    if product_id is not None:
+        with _sku_lock:
+            SKU_CACHE[sku] = product_id
+    return product_id
+
+def _lookup_sku_rest(sku):
+    """
+    Fallback SKU lookup over the REST product list, used when the GraphQL
+    query is unavailable. Requests only the id and variants fields and
+    follows Link-header pagination so catalogs beyond the first page are
+    still covered.
+    """
+    url = f"{STORE_URL}/products.json"
+    params = {'fields': 'id,variants', 'limit': 250}
+    while url:
+        try:
+            response = SESSION.get(url, params=params)
+        except requests.exceptions.RequestException as e:
+            logging.exception("Failed to fetch products from the target store.")
+            raise Exception("Failed to fetch products") from e
+
+        if response.status_code != 200:
+            logging.error("Error fetching products: %s %s", response.status_code, response.text)
+            raise Exception(f"Error fetching products: {response.status_code}")
+
+        products = response.json().get("products", [])
+        match = next((p["id"] for p in products
+                      for v in p.get("variants", []) if v.get("sku") == sku), None)
+        if match is not None:
+            return str(match)
+
+        next_link = response.links.get('next')
+        url = next_link['url'] if next_link else None
+        params = None  # the next-page URL already carries its query string
+    return None
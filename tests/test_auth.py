@@ -0,0 +1,58 @@
+import base64
+import hashlib
+import hmac
+import os
+
+import pytest
+
+# The app validates its configuration at import time, so the test
+# environment has to exist before shopify_webhook is imported.
+os.environ.setdefault('SHOPIFY_ACCESS_TOKEN', 'test-token')
+os.environ.setdefault('STORE_URL', 'https://target.example.com/admin/api/2024-01')
+os.environ.setdefault('SHOPIFY_WEBHOOK_SECRET', 'test-secret')
+
+from shopify_webhook import app as webhook_app
+
+
+class _NoNetworkSession:
+    """
+    Stand-in for the Shopify session: any outbound call in these tests
+    means unauthenticated traffic reached the Admin API, which is a bug.
+    """
+    def __getattr__(self, name):
+        raise AssertionError(f"unexpected outbound Shopify call: SESSION.{name}")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webhook_app, 'SESSION', _NoNetworkSession())
+    return webhook_app.create_app().test_client()
+
+
+def _sign(body):
+    digest = hmac.new(b'test-secret', body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def test_missing_hmac_header_returns_400(client):
+    response = client.post('/webhook', data=b'{"id": 1}')
+    assert response.status_code == 400
+
+
+def test_bogus_body_returns_401_without_outbound_calls(client):
+    # Signature is valid for a different body, as a spoofed request's would be.
+    response = client.post(
+        '/webhook',
+        data=b'{"id": 1, "variants": [{"sku": "ABC-1"}]}',
+        headers={'X-Shopify-Hmac-Sha256': _sign(b'{"id": 999}')},
+    )
+    assert response.status_code == 401
+
+
+def test_garbage_hmac_header_returns_401(client):
+    response = client.post(
+        '/webhook',
+        data=b'{"id": 1}',
+        headers={'X-Shopify-Hmac-Sha256': 'not base64!!'},
+    )
+    assert response.status_code == 401
@@ -0,0 +1,20 @@
+# gevent must patch the stdlib before anything else imports socket/ssl, so
+# these two lines have to stay at the very top of the entry point. With the
+# patch applied, `requests` calls in the webhook yield on I/O instead of
+# blocking the whole process, letting one worker absorb webhook bursts.
+import gevent.monkey
+gevent.monkey.patch_all()
+
+import os
+
+from gevent.pywsgi import WSGIServer
+
+from shopify_webhook import create_app
+
+app = create_app()
+
+# For production prefer:
+#   gunicorn -k gevent -w 2 --worker-connections 1000 wsgi:app
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', '8000'))
+    WSGIServer(('0.0.0.0', port), app).serve_forever()